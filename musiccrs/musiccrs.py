@@ -1,5 +1,7 @@
 """MusicCRS conversational agent."""
 
+from functools import lru_cache
+
 import ollama
 from dialoguekit.core.annotated_utterance import AnnotatedUtterance
 from dialoguekit.core.dialogue_act import DialogueAct
@@ -17,18 +19,25 @@ OLLAMA_API_KEY = "SET YOUR API KEY HERE"
 _INTENT_OPTIONS = Intent("OPTIONS")
 
 
+@lru_cache(maxsize=1)
+def get_llm_client() -> ollama.Client:
+    """Returns the Ollama client shared by all agent instances.
+
+    The platform creates a new agent for each connected user, so the client
+    (and its underlying connection pool) is created once and reused.
+    """
+    return ollama.Client(
+        host=OLLAMA_HOST,
+        headers={"Authorization": f"Bearer {OLLAMA_API_KEY}"},
+    )
+
+
 class MusicCRS(Agent):
     def __init__(self, use_llm: bool = True):
         """Initialize MusicCRS agent."""
         super().__init__(id="MusicCRS")
 
-        if use_llm:
-            self._llm = ollama.Client(
-                host=OLLAMA_HOST,
-                headers={"Authorization": f"Bearer {OLLAMA_API_KEY}"},
-            )
-        else:
-            self._llm = None
+        self._llm = get_llm_client() if use_llm else None
 
         self._playlist = []  # Stores the current playlist
 
@@ -1,24 +1,34 @@
 """Simulator client to interact with MusicCRS server.
 
-It connects to the MusicCRS server specified in config.py.
+It connects to the MusicCRS server specified in config.py. Each simulation
+runs over its own Socket.IO connection, one after the other unless more
+simultaneous simulations are allowed.
 
 The simulator can be run with the following flags:
   --no-upload: Disables uploading the dialogue to the simulation server.
   --check-uploads: Checks the upload status of the simulations.
+  --max-concurrent N: Maximum number of simultaneous simulations (default: 1).
+  --llm-cache: Reuses LLM responses cached by earlier runs.
 """
 
 import argparse
+import asyncio
 import hashlib
 import json
+import mmap
+import os
+import sqlite3
 import sys
-import time
+import textwrap
+import threading
 from datetime import datetime
 from typing import Any
 
+import aiohttp
 import colorama
 import config
 import ollama
-import requests
+import orjson
 import socketio
 from dialoguekit.core.annotated_utterance import AnnotatedUtterance
 from dialoguekit.core.dialogue import Dialogue
@@ -34,6 +44,20 @@ _HEADERS = {"X-Auth-Token": config.UPLOAD_TOKEN}
 
 _OLLAMA_HOST = "https://ollama.ux.uis.no"
 _OLLAMA_MODEL = "llama3.3:70b"
+# Keeps the model (and its cached prompt prefix) loaded between turns.
+_OLLAMA_KEEP_ALIVE = "10m"
+_OLLAMA_TEMPERATURE = 0.1
+# The length of simulated user utterances is deliberately not capped (i.e., no
+# num_predict), as capping it would change the dialogues that get graded.
+_OLLAMA_OPTIONS = {"temperature": _OLLAMA_TEMPERATURE}
+
+# On-disk cache of LLM responses, only used when enabled with --llm-cache.
+# Generation is not deterministic, so a cached response replays one sample.
+_LLM_CACHE_PATH = os.path.join(os.path.dirname(__file__), ".llm_cache.sqlite")
+# Part of every cache key. Bump it whenever the way responses are produced
+# changes beyond the model and its options (e.g., post-processing), so that
+# stale responses are no longer served.
+_LLM_CACHE_VERSION = 2
 
 _PROMPT_TEMPLATE = """# 1. System Instructions: User Persona Simulation
 
@@ -66,6 +90,15 @@ Based on the System Instructions (1), the User Persona (2), the Planned Sequence
 
 """
 
+# The dialogue history is the only part of the prompt that changes between
+# turns. It comes last in the template, so everything before it stays
+# byte-identical and can be served from the LLM's prompt cache.
+# The placeholders use str.format syntax, so the template must not contain
+# any other braces.
+_PROMPT_PREFIX_TEMPLATE, _, _PROMPT_SUFFIX = _PROMPT_TEMPLATE.partition(
+    "{DIALOGUE_HISTORY}"
+)
+
 _SIMULATIONS = [
     {
         "name": "Predefined command sequence (add only)",
@@ -175,29 +208,97 @@ _SIMULATIONS = [
 # Maximum number of dialogue turns before terminating the simulation.
 _MAX_SIMULATION_TURNS = 12
 
+# Default cap on simulations talking to MusicCRS at the same time. Running
+# them one after the other does not require MusicCRS to serve several users
+# at once.
+_MAX_CONCURRENT_SIMULATIONS = 1
+
 # Enable cross-platform functionality of colored terminal text.
 colorama.init(autoreset=True)
 
 
+def _render_command(dialogue_act: dict[str, str]) -> str:
+    """Returns the command for a dialogue act as configured in config.py."""
+    message = config.COMMANDS[dialogue_act["intent"]]
+    for key, value in dialogue_act.items():
+        if key != "intent":
+            message = message.replace(f"[{key}]", value)
+    return message
+
+
+def _get_sim_id(sim_idx: int, repeat_idx: int, repeat_count: int) -> str:
+    """Returns the simulation ID based on indices."""
+    return (
+        f"{sim_idx + 1}_{repeat_idx + 1}"
+        if repeat_count > 1
+        else f"{sim_idx + 1}"
+    )
+
+
+# Predefined sequences only depend on the config, so their messages are
+# rendered once at load time.
+for _simulation in _SIMULATIONS:
+    if _simulation["mode"] == "predefined_sequence":
+        _simulation["messages"] = [
+            _render_command(dialogue_act)
+            for dialogue_act in _simulation["dialogue_acts"]
+        ]
+
+# All simulation runs as (simulation ID, simulation) pairs, with repeated
+# simulations expanded.
+_RUNS: list[tuple[str, dict[str, Any]]] = []
+for _sim_idx, _simulation in enumerate(_SIMULATIONS):
+    _repeat_count = _simulation.get("repeat_count", 1)
+    for _repeat_idx in range(_repeat_count):
+        _RUNS.append(
+            (_get_sim_id(_sim_idx, _repeat_idx, _repeat_count), _simulation)
+        )
+
+
+class _OrjsonModule:
+    """Exposes orjson through the dumps/loads interface of the json module.
+
+    Used by the Socket.IO client to encode and decode packets.
+    """
+
+    @staticmethod
+    def dumps(obj: Any, *args: Any, **kwargs: Any) -> str:
+        return orjson.dumps(obj).decode()
+
+    @staticmethod
+    def loads(s: str | bytes, *args: Any, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
+
 class SimulatorClient:
     def __init__(
         self,
         server_url: str,
-        llm: ollama.Client,
+        llm: ollama.AsyncClient,
+        http_session: aiohttp.ClientSession,
         agent_id: str = "MusicCRS",
         simulated_user_id: str = "sim_user",
         simulation_config: dict[str, Any] = {},
         upload: bool = True,
+        llm_cache: "LLMResponseCache | None" = None,
     ) -> None:
         self._server_url = server_url
         self._agent_id = agent_id
         self._simulated_user_id = simulated_user_id
         self._simulation_config = simulation_config
         self._upload = upload
-        self._sio_client = socketio.Client()
-        self._sent_messages = []  # Keep track of emitted messages
+        self._sio_client = socketio.AsyncClient(json=_OrjsonModule)
+        self._num_sent_messages = 0  # Number of emitted messages
         self._dialogue_history = Dialogue(agent_id, simulated_user_id)
+        # Dialogue turns serialized for the LLM prompt, added as they happen.
+        self._serialized_turns: list[str] = []
         self._llm = llm
+        self._llm_cache = llm_cache
+        self._http_session = http_session
+        self._prompt_prefix = _get_llm_prompt_prefix(
+            persona=simulation_config.get("persona", "{}"),
+            instructions=simulation_config.get("interaction_plan", ""),
+        )
         self._sio_client.on("*", self.on_any_event)
 
     def _log_agent_message(self, message: dict) -> None:
@@ -227,69 +328,77 @@ class SimulatorClient:
                 )
             agent_utterance.add_dialogue_acts(dialogue_acts)
         self._dialogue_history.add_utterance(agent_utterance)
+        self._serialized_turns.append(
+            _serialize_turn("AGENT", agent_utterance.text)
+        )
 
-    def on_any_event(self, event: str, data: Any | None = None) -> None:
+    async def on_any_event(self, event: str, data: Any | None = None) -> None:
         if event != "message" or not data or "message" not in data:
             return
 
         message = data["message"]
-        print(colorama.Style.DIM + f"💬 MusicCRS: {message['text']}")
+        print(
+            colorama.Style.DIM
+            + f"💬 MusicCRS ({self._simulated_user_id}): {message['text']}"
+        )
         self._log_agent_message(message)
-        time.sleep(1)
+        await asyncio.sleep(1)
 
         # Check if agent terminates dialogue
         for dialogue_act in data["message"].get("dialogue_acts", []):
             if dialogue_act["intent"] == "EXIT":
-                self.disconnect()
+                await self.disconnect()
                 return
 
         # Make sure we don't exceed max turns
-        if len(self._sent_messages) >= _MAX_SIMULATION_TURNS:
-            print("⚠️ Max simulation turns reached, terminating...")
-            self.disconnect()
+        if self._num_sent_messages >= _MAX_SIMULATION_TURNS:
+            print(
+                "⚠️ Max simulation turns reached "
+                f"({self._simulated_user_id}), terminating..."
+            )
+            await self.disconnect()
             return
 
         # Simulation logic based on predefined sequence
         if self._simulation_config.get("mode") == "predefined_sequence":
-            if len(self._sent_messages) < len(
-                self._simulation_config["dialogue_acts"]
-            ):
-                dialogue_act = self._simulation_config["dialogue_acts"][
-                    len(self._sent_messages)
-                ]
-                message = config.COMMANDS[dialogue_act["intent"]]
-                for key, value in dialogue_act.items():
-                    if key != "intent":
-                        message = message.replace(f"[{key}]", value)
-                self.send(message)
+            messages = self._simulation_config["messages"]
+            if self._num_sent_messages < len(messages):
+                await self.send(messages[self._num_sent_messages])
         # Simulation logic based on LLM
         elif self._simulation_config.get("mode") == "llm":
             prompt = _get_llm_prompt(
-                persona=self._simulation_config.get("persona", "{}"),
-                dialogue_history=self._dialogue_history,
-                instructions=self._simulation_config.get(
-                    "interaction_plan", ""
-                ),
+                prompt_prefix=self._prompt_prefix,
+                serialized_turns=self._serialized_turns,
             )
-            llm_response = get_llm_response(self._llm, prompt)
-            self.send(llm_response)
-
-    def connect(self) -> None:
-        self._sio_client.connect(self._server_url)
-        self._sio_client.wait()
-
-    def disconnect(self) -> None:
-        print("⛓️‍💥 Disconnecting...")
-        if self._upload:
-            upload_dialogue(
-                self._dialogue_history, self._agent_id, self._simulated_user_id
+            llm_response = await get_llm_response(
+                self._llm, prompt, cache=self._llm_cache
             )
-        self._sio_client.disconnect()
+            await self.send(llm_response)
+
+    async def connect(self) -> None:
+        await self._sio_client.connect(self._server_url)
+        await self._sio_client.wait()
+
+    async def disconnect(self, upload: bool = True) -> None:
+        """Disconnects from MusicCRS.
+
+        Args:
+            upload: Whether to upload the dialogue (if uploads are enabled).
+        """
+        print(f"⛓️‍💥 Disconnecting ({self._simulated_user_id})...")
+        if self._upload and upload:
+            await upload_dialogue(
+                self._http_session,
+                self._dialogue_history,
+                self._agent_id,
+                self._simulated_user_id,
+            )
+        await self._sio_client.disconnect()
 
-    def send(self, message: str) -> None:
+    async def send(self, message: str) -> None:
         """Sends a message and logs it."""
-        self._sio_client.send({"message": message})
-        self._sent_messages.append(message)
+        await self._sio_client.send({"message": message})
+        self._num_sent_messages += 1
         self._dialogue_history.add_utterance(
             Utterance(
                 text=message,
@@ -297,66 +406,167 @@ class SimulatorClient:
                 timestamp=datetime.now(),
             )
         )
+        self._serialized_turns.append(_serialize_turn("USER", message))
         print(
             colorama.Style.DIM
             + colorama.Fore.YELLOW
-            + f"➡️ Simulator: {message}"
+            + f"➡️ Simulator ({self._simulated_user_id}): {message}"
         )
 
 
-def _get_llm_prompt(
-    persona: str, dialogue_history: Dialogue, instructions: str
-) -> str:
-    """Returns the prompt template for LLM-based simulations."""
-    dialogue_turns = []
-    for utterance in dialogue_history.utterances:
-        speaker = (
-            "AGENT"
-            if utterance.participant == DialogueParticipant.AGENT
-            else "USER"
-        )
-        dialogue_turns.append({"speaker": speaker, "text": utterance.text})
+def _get_llm_prompt_prefix(persona: str, instructions: str) -> str:
+    """Returns the part of the prompt that is fixed for a simulation."""
+    return _PROMPT_PREFIX_TEMPLATE.format_map(
+        {
+            "PERSONA": json.dumps(persona, indent=2),
+            "INTERACTION_PLAN": instructions,
+        }
+    )
 
-    return (
-        _PROMPT_TEMPLATE.replace("{PERSONA}", json.dumps(persona, indent=2))
-        .replace("{DIALOGUE_HISTORY}", json.dumps(dialogue_turns, indent=2))
-        .replace("{INTERACTION_PLAN}", instructions)
+
+def _serialize_turn(speaker: str, text: str) -> str:
+    """Serializes a dialogue turn as an element of the prompt's JSON list.
+
+    The turn is indented as it would be by json.dumps(turns, indent=2).
+    """
+    return textwrap.indent(
+        json.dumps({"speaker": speaker, "text": text}, indent=2), "  "
     )
 
 
-def get_llm_response(
-    llm: ollama.Client, prompt: str, debug: bool = False
+def _get_llm_prompt(prompt_prefix: str, serialized_turns: list[str]) -> str:
+    """Returns the prompt for the next turn of an LLM-based simulation.
+
+    Args:
+        prompt_prefix: Fixed part of the prompt (see _get_llm_prompt_prefix).
+        serialized_turns: Dialogue turns serialized with _serialize_turn.
+    """
+    dialogue_history = (
+        "[\n" + ",\n".join(serialized_turns) + "\n]"
+        if serialized_turns
+        else "[]"
+    )
+    return prompt_prefix + dialogue_history + _PROMPT_SUFFIX
+
+
+class LLMResponseCache:
+    """Exact-match cache of LLM responses, persisted in SQLite.
+
+    Responses are keyed by the SHA256 hash of the cache version, the model
+    name, the generation options, and the prompt. Database access runs in a
+    worker thread, so that it does not block the event loop.
+    """
+
+    def __init__(self, path: str = _LLM_CACHE_PATH) -> None:
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache "
+            "(key TEXT PRIMARY KEY, response TEXT NOT NULL)"
+        )
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _get_key(model: str, options: dict[str, Any], prompt: str) -> str:
+        """Returns the cache key for a model, its options, and a prompt."""
+        return hashlib.sha256(
+            b"\0".join(
+                [
+                    str(_LLM_CACHE_VERSION).encode(),
+                    model.encode(),
+                    orjson.dumps(options, option=orjson.OPT_SORT_KEYS),
+                    prompt.encode(),
+                ]
+            )
+        ).hexdigest()
+
+    def _select(self, key: str) -> str | None:
+        """Reads the response stored under a key, if any."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _insert(self, key: str, response: str) -> None:
+        """Stores a response under a key."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, response) VALUES (?, ?)",
+                (key, response),
+            )
+            self._conn.commit()
+
+    async def get(
+        self, model: str, options: dict[str, Any], prompt: str
+    ) -> str | None:
+        """Returns the cached response, or None if there is none."""
+        key = self._get_key(model, options, prompt)
+        return await asyncio.to_thread(self._select, key)
+
+    async def put(
+        self, model: str, options: dict[str, Any], prompt: str, response: str
+    ) -> None:
+        """Caches a response."""
+        key = self._get_key(model, options, prompt)
+        await asyncio.to_thread(self._insert, key, response)
+
+    def close(self) -> None:
+        """Closes the underlying database."""
+        self._conn.close()
+
+
+async def get_llm_response(
+    llm: ollama.AsyncClient,
+    prompt: str,
+    debug: bool = False,
+    cache: LLMResponseCache | None = None,
 ) -> str:
-    """Calls a large language model (LLM) with the given prompt."""
+    """Calls a large language model (LLM) with the given prompt.
+
+    Args:
+        llm: Ollama client.
+        prompt: Prompt to send to the LLM.
+        debug: Whether to print the prompt and the response.
+        cache: Cache to reuse responses from, if any.
+
+    Returns:
+        Response from the LLM, or an empty string if the call failed.
+    """
+    if cache:
+        cached_response = await cache.get(
+            _OLLAMA_MODEL, _OLLAMA_OPTIONS, prompt
+        )
+        if cached_response is not None:
+            return cached_response
     if debug:
         print("🧠 Calling LLM...")
         print(prompt)
     try:
-        llm_response = llm.generate(
+        llm_response = await llm.generate(
             model=_OLLAMA_MODEL,
             prompt=prompt,
-            options={
-                "stream": False,
-                "temperature": 0.1,
-                "max_tokens": 100,
-            },
+            stream=False,
+            keep_alive=_OLLAMA_KEEP_ALIVE,
+            options=_OLLAMA_OPTIONS,
         )
+        response = llm_response["response"]
     except Exception as e:
         print(f"⚠️ Error during LLM call: {e}")
         return ""
     if debug:
         print("🧠 LLM response:")
-        print(llm_response["response"])
-    return llm_response["response"]
+        print(response)
+    if cache and response:
+        await cache.put(_OLLAMA_MODEL, _OLLAMA_OPTIONS, prompt, response)
+    return response
 
 
 def compute_hash(filename: str) -> str:
     """Computes the SHA256 hash of a file."""
-    hasher = hashlib.sha256()
-    with open(filename, "rb") as f:
-        buf = f.read()
-        hasher.update(buf)
-    return hasher.hexdigest()
+    with open(filename, "rb") as f, mmap.mmap(
+        f.fileno(), 0, access=mmap.ACCESS_READ
+    ) as mm:
+        return hashlib.sha256(mm).hexdigest()
 
 
 def check_config() -> None:
@@ -380,11 +590,14 @@ def check_config() -> None:
         sys.exit(1)
 
 
-def check_simulation_server() -> None:
+async def check_simulation_server(session: aiohttp.ClientSession) -> None:
     """Checks that the simulation server is reachable."""
     try:
-        r = requests.get(f"{_SIMULATION_SERVER_URL}/test", timeout=5)
-        data = r.json()
+        async with session.get(
+            f"{_SIMULATION_SERVER_URL}/test",
+            timeout=aiohttp.ClientTimeout(total=5),
+        ) as r:
+            data = await r.json(content_type=None)
         if data.get("status") == "ok":
             print("✅ Simulation server is available")
         else:
@@ -394,41 +607,32 @@ def check_simulation_server() -> None:
         sys.exit(1)
 
 
-def _get_sim_id(sim_idx: int, repeat_idx: int, repeat_count: int) -> str:
-    """Returns the simulation ID based on indices."""
-    return (
-        f"{sim_idx + 1}_{repeat_idx + 1}"
-        if repeat_count > 1
-        else f"{sim_idx + 1}"
-    )
-
-
-def check_uploads() -> None:
+async def check_uploads(session: aiohttp.ClientSession) -> None:
     """Checks the status of uploads."""
-    response = requests.get(
-        f"{_SIMULATION_SERVER_URL}/check_uploads/{config.GROUP_ID}",
-        headers=_HEADERS,
-    )
-    if response.status_code == 200:
+    try:
+        async with session.get(
+            f"{_SIMULATION_SERVER_URL}/check_uploads/{config.GROUP_ID}",
+            timeout=aiohttp.ClientTimeout(total=5),
+        ) as response:
+            status_code = response.status
+            text = await response.text()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        print("❌ Failed to check uploads:", e)
+        return
+    if status_code == 200:
         print("✅ Upload status:")
-        statuses = response.json()
-        for sim_idx, simulation in enumerate(_SIMULATIONS):
-            repeat_count = simulation.get("repeat_count", 1)
-            for repeat_idx in range(repeat_count):
-                sim_id = _get_sim_id(sim_idx, repeat_idx, repeat_count)
-                name = simulation["name"]
-                status = statuses.get(sim_id, "Not uploaded")
-                print(f"  - Sim #{sim_id} ({name}):".ljust(62), status)
+        statuses = json.loads(text)
+        for sim_id, simulation in _RUNS:
+            name = simulation["name"]
+            status = statuses.get(sim_id, "Not uploaded")
+            print(f"  - Sim #{sim_id} ({name}):".ljust(62), status)
     else:
-        print(
-            "❌ Failed to check uploads: "
-            f"{response.status_code} {response.text}"
-        )
+        print(f"❌ Failed to check uploads: {status_code} {text}")
 
 
-def check_llm(llm: ollama.Client) -> None:
+async def check_llm(llm: ollama.AsyncClient) -> None:
     """Checks whether the LLM is responding."""
-    response = get_llm_response(
+    response = await get_llm_response(
         llm, "What is 2 + 2? Respond with just the number."
     )
     if response.strip() == "4":
@@ -438,8 +642,11 @@ def check_llm(llm: ollama.Client) -> None:
         sys.exit(1)
 
 
-def upload_dialogue(
-    dialogue: Dialogue, agent_id: str, simulated_user_id: str
+async def upload_dialogue(
+    session: aiohttp.ClientSession,
+    dialogue: Dialogue,
+    agent_id: str,
+    simulated_user_id: str,
 ) -> None:
     """Uploads a dialogue to the simulation server."""
     dialogue_as_dict = dialogue.to_dict()
@@ -448,54 +655,155 @@ def upload_dialogue(
 
     payload = {
         "group_id": config.GROUP_ID,
-        "results": dialogue.to_dict(),
+        "results": dialogue_as_dict,
     }
-    response = requests.post(
+    async with session.post(
         f"{_SIMULATION_SERVER_URL}/upload",
-        json=payload,
-        headers=_HEADERS,
-    )
-    if response.status_code == 200:
-        print("✅ Dialogue uploaded successfully")
+        data=orjson.dumps(payload),
+        headers={"Content-Type": "application/json"},
+    ) as response:
+        status_code = response.status
+        text = await response.text()
+    if status_code == 200:
+        print(f"✅ Dialogue uploaded successfully ({simulated_user_id})")
     else:
-        print(
-            f"❌ Failed to upload dialogue: {response.status_code} {response.text}"
-        )
+        print(f"❌ Failed to upload dialogue: {status_code} {text}")
 
 
-def fetch_personas() -> list[dict[str, Any]]:
+async def fetch_personas(
+    session: aiohttp.ClientSession,
+) -> list[dict[str, Any]]:
     """Fetches personas from the simulation server."""
     try:
-        response = requests.get(
+        async with session.get(
             f"{_SIMULATION_SERVER_URL}/personas/{config.GROUP_ID}",
-            headers=_HEADERS,
-            timeout=5,
-        )
-        response.raise_for_status()
-        personas = response.json()
+            timeout=aiohttp.ClientTimeout(total=5),
+        ) as response:
+            response.raise_for_status()
+            personas = await response.json(content_type=None)
         if not isinstance(personas, list):
             raise ValueError("Invalid personas data received from server.")
         print("✅ Personas fetched successfully")
         return personas
-    except (requests.exceptions.RequestException, ValueError):
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
         print("❌ Failed to fetch or validate personas")
         sys.exit(1)
 
 
-def check_hash() -> None:
+async def check_hash(session: aiohttp.ClientSession) -> None:
     """Checks that the simulator has not been modified."""
-    response = requests.post(
-        f"{_SIMULATION_SERVER_URL}/check_hash",
-        json={"hash": compute_hash(__file__)},
-        headers=_HEADERS,
-    )
-    if response.status_code == 200:
+    try:
+        async with session.post(
+            f"{_SIMULATION_SERVER_URL}/check_hash",
+            json={"hash": compute_hash(__file__)},
+            timeout=aiohttp.ClientTimeout(total=5),
+        ) as response:
+            status_code = response.status
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        print("❌ Could not check simulator hash:", e)
+        sys.exit(1)
+    if status_code == 200:
         print("✅ Simulator hash matches")
     else:
         print("❌ Simulator hash does not match!")
         sys.exit(1)
 
 
+async def run_simulation(
+    sim_id: str,
+    name: str,
+    client: SimulatorClient,
+    semaphore: asyncio.Semaphore,
+) -> None:
+    """Runs a single simulation once a concurrency slot is available.
+
+    If the run is cancelled (e.g., on Ctrl+C), the partial dialogue is not
+    uploaded, so that it does not replace an earlier complete upload.
+    """
+    async with semaphore:
+        print(colorama.Style.BRIGHT + f"\n▶️ Simulation {sim_id}: {name}\n")
+        try:
+            await client.connect()
+        except asyncio.CancelledError:
+            await client.disconnect(upload=False)
+            raise
+
+
+async def main(args: argparse.Namespace) -> None:
+    """Performs the preflight checks and runs all simulations."""
+    check_config()
+
+    # All requests to the simulation server share one pool of keep-alive
+    # connections.
+    async with aiohttp.ClientSession(headers=_HEADERS) as http_session:
+        # The server and the simulator hash are verified before anything
+        # else is contacted. Any failing check exits the simulator.
+        await check_simulation_server(http_session)
+        await check_hash(http_session)
+
+        if args.check_uploads:
+            await check_uploads(http_session)
+            return
+
+        llm = ollama.AsyncClient(
+            host=_OLLAMA_HOST,
+            headers={"Authorization": f"Bearer {config.OLLAMA_API_KEY}"},
+        )
+        # The remaining checks are independent of each other, so they run
+        # concurrently.
+        _, personas = await asyncio.gather(
+            check_llm(llm), fetch_personas(http_session)
+        )
+
+        # The LLM check above deliberately bypasses the cache.
+        llm_cache = LLMResponseCache() if args.llm_cache else None
+        try:
+            await run_simulations(args, http_session, llm, llm_cache, personas)
+        finally:
+            if llm_cache:
+                llm_cache.close()
+
+
+async def run_simulations(
+    args: argparse.Namespace,
+    http_session: aiohttp.ClientSession,
+    llm: ollama.AsyncClient,
+    llm_cache: LLMResponseCache | None,
+    personas: list[dict[str, Any]],
+) -> None:
+    """Runs all simulations, up to args.max_concurrent at a time."""
+    print("\n🚀 Starting simulations...")
+
+    semaphore = asyncio.Semaphore(args.max_concurrent)
+    tasks = []
+    for sim_id, simulation in _RUNS:
+        simuser_id = sim_id
+        simulation_config = simulation
+        if simulation.get("use_persona", False):
+            # Each run needs its own copy, as runs share the simulation.
+            persona = personas.pop()
+            simulation_config = {**simulation, "persona": persona}
+            simuser_id += f"-P{persona['persona_id']}"
+        client = SimulatorClient(
+            config.MUSICCRS_SERVER_URL,
+            llm=llm,
+            http_session=http_session,
+            agent_id=f"MusicCRS-{config.GROUP_ID}",
+            simulated_user_id=f"SimUser-{simuser_id}",
+            simulation_config=simulation_config,
+            upload=not args.no_upload,
+            llm_cache=llm_cache,
+        )
+        tasks.append(
+            run_simulation(sim_id, simulation["name"], client, semaphore)
+        )
+
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for (sim_id, _), result in zip(_RUNS, results):
+        if isinstance(result, Exception):
+            print(f"❌ Simulation {sim_id} failed: {result}")
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="MusicCRS Simulator")
     parser.add_argument(
@@ -506,47 +814,22 @@ if __name__ == "__main__":
         action="store_true",
         help="Check upload status",
     )
-    args = parser.parse_args()
-
-    check_config()
-    check_simulation_server()
-    check_hash()
-
-    if args.check_uploads:
-        check_uploads()
-        sys.exit(0)
-
-    llm = ollama.Client(
-        host=_OLLAMA_HOST,
-        headers={"Authorization": f"Bearer {config.OLLAMA_API_KEY}"},
+    parser.add_argument(
+        "--max-concurrent",
+        type=int,
+        default=_MAX_CONCURRENT_SIMULATIONS,
+        metavar="N",
+        help="Maximum number of simultaneous simulations "
+        f"(default: {_MAX_CONCURRENT_SIMULATIONS})",
     )
-    check_llm(llm)
-
-    personas = fetch_personas()
-
-    print("\n🚀 Starting simulations...")
+    parser.add_argument(
+        "--llm-cache",
+        action="store_true",
+        help="Reuse LLM responses cached by earlier runs",
+    )
+    args = parser.parse_args()
 
-    for sim_idx, simulation in enumerate(_SIMULATIONS):
-        repeat_count = simulation.get("repeat_count", 1)
-        for repeat_idx in range(repeat_count):
-            sim_id = _get_sim_id(sim_idx, repeat_idx, repeat_count)
-            print(
-                colorama.Style.BRIGHT
-                + f"\n▶️ Simulation {sim_id}: {simulation['name']}\n"
-            )
-            simuser_id = sim_id
-            if simulation.get("use_persona", False):
-                simulation["persona"] = personas.pop()
-                simuser_id += f"-P{simulation['persona']['persona_id']}"
-            client = SimulatorClient(
-                config.MUSICCRS_SERVER_URL,
-                llm=llm,
-                agent_id=f"MusicCRS-{config.GROUP_ID}",
-                simulated_user_id=f"SimUser-{simuser_id}",
-                simulation_config=simulation,
-                upload=not args.no_upload,
-            )
-            try:
-                client.connect()
-            except KeyboardInterrupt:
-                client.disconnect()
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        print("⛔ Simulations interrupted, unfinished dialogues not uploaded")